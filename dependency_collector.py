@@ -1,9 +1,35 @@
 import ast
-from collections import ChainMap
-from types import MappingProxyType as readonlydict
+
+# sentinel recorded in the undo log for names that were unbound before a scope
+_MISSING = object()
+# marker pushed onto the traversal stack to close a function or class scope
+_EXIT_SCOPE = object()
+# node class -> name of its handler; interned once so dispatch never builds 'visit_' strings
+_VISIT_NAMES = {
+    ast.FunctionDef: 'visit_FunctionDef',
+    ast.AsyncFunctionDef: 'visit_FunctionDef',
+    ast.Lambda: 'visit_Lambda',
+    ast.ClassDef: 'visit_ClassDef',
+    ast.Import: 'visit_Import',
+    ast.ImportFrom: 'visit_ImportFrom',
+    ast.Name: 'visit_Name',
+}
+
+# nodes that can never contain an import, a scope or a name, so the walk doesn't descend into them.
+_LEAF_NODES = frozenset(
+    [ast.Constant, ast.Pass, ast.Break, ast.Continue, ast.Global, ast.Nonlocal, ast.alias]
+    + [
+        node_class
+        for base in (ast.expr_context, ast.operator, ast.boolop, ast.cmpop, ast.unaryop)
+        for node_class in base.__subclasses__()
+    ]
+)
 
 
 class ModuleUseCollector(ast.NodeVisitor):
+    # collector class -> {node class: unbound handler}, filled lazily per class
+    _handler_cache = {}
+
     def __init__(self, modulename, package=''):
         """initialize the class ModuleUseCollector, inherited from ast.NodeVisitor.
 
@@ -19,11 +45,150 @@ class ModuleUseCollector(ast.NodeVisitor):
         # used to resolve from ... import ... references
         self.package = package
         self.modulepackage, _, self.modulestem = modulename.rpartition('.')
-        # track scope namespaces, with a mapping of imported names (bound name to original)
+        # resolved once here rather than on every relative import:
+        # _parent_by_level[level - 1] is the package `from <level dots> import` refers to.
+        self._package_parts = tuple(package.split('.'))
+        self._parent_by_level = [
+            '.'.join(self._package_parts[:len(self._package_parts) - (level - 1)])
+            for level in range(1, len(self._package_parts) + 2)
+        ]
+        self._name_prefix = modulename + '.'
+        # flat mapping of imported names visible in the current scope (bound name to original).
         # If a name references None it is used for a different purpose in that scope
         # and so masks a name in the global namespace.
-        self.scopes = ChainMap()
+        self.bindings = {}
+        # one (undo log, readonly) frame per nested scope; the undo log holds
+        # (name, previous value or _MISSING) entries to replay on scope exit.
+        self.scope_stack = []
         self.used_at = []  # list of (name, alias, line) entries
+        self._stack = []  # pending nodes of the iterative traversal
+        self._handlers = self._get_handlers()
+
+    @classmethod
+    def _get_handlers(cls):
+        """resolve the visit_ handlers of this class once and cache them, so
+        subclasses overriding a handler get their own table.
+
+        Returns:
+            dict -- mapping of node class to the unbound handler function.
+        """
+        handlers = ModuleUseCollector._handler_cache.get(cls)
+        if handlers is None:
+            handlers = {
+                node_class: getattr(cls, name)
+                for node_class, name in _VISIT_NAMES.items()
+            }
+            ModuleUseCollector._handler_cache[cls] = handlers
+        return handlers
+
+    @classmethod
+    def analyze_source(cls, src_bytes, modulename, package=''):
+        """compute the usage of a module in the given source code.
+
+        The source is first scanned for the module's stem; a module can't be
+        imported without naming it, so files that never mention it are skipped
+        without being parsed or walked.
+
+        Arguments:
+            src_bytes {bytes} -- source code in which the usage is searched.
+            modulename {str} -- name of the module for which we want to compute its usage.
+
+        Keyword Arguments:
+            package {str} -- Python package where the search for this module's
+                             usage should occur. (default: {''})
+
+        Returns:
+            list -- (name, alias, line) entries for every usage of the module.
+        """
+        # relative imports from inside the module itself need not spell its name
+        if not (package == modulename or package.startswith(modulename + '.')):
+            if modulename.rpartition('.')[2].encode() not in src_bytes:
+                return []
+        collector = cls(modulename, package)
+        collector.visit(ast.parse(src_bytes))
+        return collector.used_at
+
+    def visit(self, node):
+        """walk the tree rooted at node iteratively, dispatching the nodes
+        we care about to their handler and pushing the children of all others.
+
+        Arguments:
+            node {ast.AST} -- root of the tree to be walked.
+        """
+        stack = self._stack
+        stack.append(node)
+        pop = stack.pop
+        handlers = self._handlers
+        leaves = _LEAF_NODES
+        AST = ast.AST
+        while stack:
+            node = pop()
+            if node is _EXIT_SCOPE:
+                self._exit_scope()
+                continue
+            handler = handlers.get(node.__class__)
+            if handler is not None:
+                handler(self, node)
+                continue
+            children = []
+            for field in node._fields:
+                value = getattr(node, field, None)
+                if isinstance(value, AST):
+                    if value.__class__ not in leaves:
+                        children.append(value)
+                elif isinstance(value, list):
+                    children.extend(
+                        item for item in value
+                        if isinstance(item, AST) and item.__class__ not in leaves
+                    )
+            # reversed so that children are popped in source order
+            stack.extend(reversed(children))
+
+    def _push_children(self, node):
+        """queue the child nodes of node so they are visited in source order.
+
+        Arguments:
+            node {ast.AST} -- node whose children are to be visited.
+        """
+        children = [
+            child for child in ast.iter_child_nodes(node)
+            if child.__class__ not in _LEAF_NODES
+        ]
+        self._stack.extend(reversed(children))
+
+    def _enter_scope(self, readonly=False):
+        """push a new scope frame onto the scope stack.
+
+        Keyword Arguments:
+            readonly {bool} -- whether names bound in this scope are ignored. (default: {False})
+        """
+        self.scope_stack.append(([], readonly))
+
+    def _exit_scope(self):
+        """pop the current scope frame, restoring every binding it changed.
+        """
+        undo, _ = self.scope_stack.pop()
+        bindings = self.bindings
+        for name, previous in reversed(undo):
+            if previous is _MISSING:
+                del bindings[name]
+            else:
+                bindings[name] = previous
+
+    def _bind(self, name, value):
+        """bind a name in the current scope, recording its previous value.
+
+        Arguments:
+            name {str} -- name bound in the current scope.
+            value {str} -- original name it refers to, or None if it masks an import.
+        """
+        if self.scope_stack:
+            undo, readonly = self.scope_stack[-1]
+            if readonly:
+                # class scope; these names can't mask anything so just ignore these.
+                return
+            undo.append((name, self.bindings.get(name, _MISSING)))
+        self.bindings[name] = value
 
     def visit_FunctionDef(self, node):
         """visit the function's definition for tracing usage.
@@ -31,9 +196,9 @@ class ModuleUseCollector(ast.NodeVisitor):
         Arguments:
             node {str} -- name of the node where we want to check the usage.
         """
-        self.scopes = self.scopes.new_child()
-        self.generic_visit(node)
-        self.scopes = self.scopes.parents
+        self._enter_scope()
+        self._stack.append(_EXIT_SCOPE)
+        self._push_children(node)
 
     def visit_Lambda(self, node):
         """visit lambda type of functions' usage.
@@ -42,21 +207,19 @@ class ModuleUseCollector(ast.NodeVisitor):
             node {str} -- name of the node where we want to check the usage.
         """
         # lambdas are just functions, albeit with no statements
-        self.visit_Function(node)
+        self.visit_FunctionDef(node)
 
     def visit_ClassDef(self, node):
         """class scope is a special local scope that is re-purposed to form
-        the class attributes. By using a read-only dict proxy here this code
-        we can expect an exception when a class body contains an import
-        statement or uses names that'd mask an imported name.
+        the class attributes. By marking the frame read-only here, names bound
+        in a class body (imports or assignments) never mask an imported name.
         
         Arguments:
             node {str} -- name of the node where we want to check the usage.
         """
-        # 
-        self.scopes = self.scopes.new_child(readonlydict({}))
-        self.generic_visit(node)
-        self.scopes = self.scopes.parents
+        self._enter_scope(readonly=True)
+        self._stack.append(_EXIT_SCOPE)
+        self._push_children(node)
 
     def visit_Import(self, node):
         """visit import declarations
@@ -64,11 +227,9 @@ class ModuleUseCollector(ast.NodeVisitor):
         Arguments:
             node {str} -- name of the node where we want to check the usage.
         """
-        self.scopes.update({
-            a.asname or a.name: a.name
-            for a in node.names
-            if a.name == self.modulename
-        })
+        for a in node.names:
+            if a.name == self.modulename:
+                self._bind(a.asname or a.name, a.name)
 
     def visit_ImportFrom(self, node):
         """resolve relative imports; from . import <name>, from ..<name> import <name>
@@ -78,24 +239,19 @@ class ModuleUseCollector(ast.NodeVisitor):
         """
         source = node.module  # can be None
         if node.level:
-            package = self.package
-            if node.level > 1:
-                # go up levels as needed
-                package = '.'.join(self.package.split('.')[:-(node.level - 1)])
+            # go up levels as needed; beyond the top level nothing is left
+            package = self._parent_by_level[node.level - 1] \
+                if node.level <= len(self._parent_by_level) else ''
             source = f'{package}.{source}' if source else package
         if self.modulename == source:
             # names imported from our target module
-            self.scopes.update({
-                a.asname or a.name: f'{self.modulename}.{a.name}'
-                for a in node.names
-            })
+            for a in node.names:
+                self._bind(a.asname or a.name, self._name_prefix + a.name)
         elif self.modulepackage and self.modulepackage == source:
             # from package import module import, where package.module is what we want
-            self.scopes.update({
-                a.asname or a.name: self.modulename
-                for a in node.names
-                if a.name == self.modulestem
-            })
+            for a in node.names:
+                if a.name == self.modulestem:
+                    self._bind(a.asname or a.name, self.modulename)
 
     def visit_Name(self, node):
         """ #TODO
@@ -105,15 +261,9 @@ class ModuleUseCollector(ast.NodeVisitor):
         """
         if not isinstance(node.ctx, ast.Load):
             # store or del operation, means the name is masked in the current scope
-            try:
-                self.scopes[node.id] = None
-            except TypeError:
-                # class scope, which we made read-only. These names can't mask
-                # anything so just ignore these.
-                pass
+            self._bind(node.id, None)
             return
-        # find scope this name was defined in, starting at the current scope
-        imported_name = self.scopes.get(node.id)
+        imported_name = self.bindings.get(node.id)
         if imported_name is None:
             return
         self.used_at.append((imported_name, node.id, node.lineno))
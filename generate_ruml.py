@@ -1,4 +1,3 @@
-import ast
 import importlib
 import os
 import pyclbr
@@ -130,10 +129,8 @@ class GRUML:
             module = file_.split('/')[-1].split('.py')[0]
             for j in files.keys():
                 try:
-                    source = open(j).read()
-                    collector = ModuleUseCollector(module)
-                    collector.visit(ast.parse(source))
-                    for use_ in collector.used_at:
+                    source = open(j, 'rb').read()
+                    for use_ in ModuleUseCollector.analyze_source(source, module):
                         _class = use_[0].split(".")[-1]
                         alias = use_[1]
                         line_no = use_[2]
@@ -167,6 +164,7 @@ class GRUML:
             agg_data, self.skip_cols)
         self.write_in_excel.write_df_to_excel(
             self.df, 'sheet_one', self.skip_cols, self.classes_covered)
+        self.write_in_excel.finalize()
 
     def generate_sequential_function_calls(self):
         """generate sequential function calls
@@ -190,6 +188,9 @@ class GRUML:
             _, _, callee_function = callee
             if caller_module not in self.source_code_modules:
                 continue
+            # calls made by or to the driver function itself are not part of the diagram.
+            if caller_function == driver_function or callee_function == driver_function:
+                continue
             function_sequence.append([caller_function, callee_function])
         for sequence in function_sequence:
             print(sequence)
@@ -197,6 +198,7 @@ class GRUML:
             self.df, function_sequence, use_case)
         self.write_in_excel.write_df_to_excel(
             self.df, 'sheet_one', self.skip_cols, self.classes_covered, use_case)
+        self.write_in_excel.finalize()
 
 
 def main():
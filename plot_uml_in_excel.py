@@ -1,11 +1,77 @@
+import logging
 from collections import defaultdict
+from itertools import chain
 
 import numpy as np
 import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.styles import Border, Font, PatternFill, Side
+from openpyxl import Workbook
+from openpyxl.cell import Cell, WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
 from openpyxl.utils import get_column_letter
 
+# styles shared by every cell they are applied to, never constructed inside loops.
+_BD = Side(style='thick', color='000000')
+BORDER_RIGHT = Border(right=_BD)
+BORDER_LEFT = Border(left=_BD)
+RED_FILL = PatternFill(start_color='FFFF0000',
+                       end_color='FFFF0000', fill_type='solid')
+BOLD_FONT = Font(bold=True)
+# header style of pandas' to_excel.
+_THIN = Side(style='thin')
+HEADER_BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='top')
+
+log = logging.getLogger(__name__)
+
+
+def _cell_value(cell):
+    """return the value of an entry in a row being built for a write-only worksheet.
+
+    Arguments:
+        cell {object} -- either a plain value or an already styled cell.
+
+    Returns:
+        object -- value to be written in the cell.
+    """
+    if isinstance(cell, Cell):
+        return cell.value
+    return cell
+
+
+def _as_cell(ws, row, column):
+    """turn an entry of a row being built for a write-only worksheet into a
+    cell that can be styled, in place.
+
+    Arguments:
+        ws {openpyxl.worksheet._write_only.WriteOnlyWorksheet} -- worksheet the row belongs to.
+        row {list} -- values (or cells) of the row.
+        column {int} -- 0-indexed column of the entry.
+
+    Returns:
+        openpyxl.cell.Cell -- the cell stored at row[column].
+    """
+    cell = row[column]
+    if not isinstance(cell, Cell):
+        cell = row[column] = WriteOnlyCell(ws, value=cell)
+    return cell
+
+
+def _normalize_sequence(function_sequence):
+    """split every event of a function sequence into its caller and callee
+    (class, function) pairs, leaving out the events of the driver function.
+
+    Arguments:
+        function_sequence {list} -- (caller, callee) events, each named as 'Class.function'.
+
+    Returns:
+        list -- ((caller class, caller function), (callee class, callee function)) events.
+    """
+    return [
+        (tuple(caller.split('.', 1)), tuple(callee.split('.', 1)))
+        for caller, callee in function_sequence
+        if caller != "main_2" and callee != "main_2"
+    ]
+
 
 class WriteInExcel:
 
@@ -16,7 +82,10 @@ class WriteInExcel:
             file_name {str} -- [description] (default: {'UML_Spreadsheet.xlsx'})
         """
         self.file_name = file_name
-        self.writer = pd.ExcelWriter(self.file_name, engine='xlsxwriter')
+        # workbook is created lazily on the first write and kept open until finalize,
+        # sheets is a sheet_name: worksheet mapping of the sheets written to it.
+        self.workbook = None
+        self.sheets = {}
         self.count = 0
 
     def get_number_of_rows_in_df(self, agg_data):
@@ -33,6 +102,19 @@ class WriteInExcel:
             number_of_rows += 1 + len(class_dict['Methods'])
         return number_of_rows
 
+    def _extend_dark_edge(self, column, row):
+        """widen the dark edge range of a column so that it covers the given row.
+
+        Arguments:
+            column {int} -- column of the dataframe in which the dark edge is drawn.
+            row {int} -- row of the dataframe that the dark edge has to reach.
+        """
+        entry = self.dark_edges_column[column]
+        if row < entry[0]:
+            entry[0] = row
+        if row > entry[1]:
+            entry[1] = row
+
     def create_pandas_dataframe(self, agg_data, skip_cols):
         """create pandas dataframe to be plotted in the excel/csv sheet.
 
@@ -47,10 +129,10 @@ class WriteInExcel:
         number_of_rows = self.get_number_of_rows_in_df(agg_data)
         print('Number of rows in total: {}'.format(number_of_rows))
         columns = ['' for _ in range(skip_cols+2)]
-        df = pd.DataFrame(
-            index=np.arange(0, number_of_rows),
-            columns=columns+['Class']
-        )
+        # fill a plain object array and build the dataframe once at the end,
+        # instead of paying for a pandas write per cell.
+        data = np.empty((number_of_rows, skip_cols+3), dtype=object)
+        data.fill('')
         row_counter = 0
         column_counter = skip_cols-1
         # mapping to store row, col for dependents.
@@ -58,27 +140,29 @@ class WriteInExcel:
         # parent: child mapping created just for plotting tree like line
         parent_to_child_mapping = defaultdict(list)
         dependee_to_dependents_mapping = defaultdict(list)
-        # {class: [row number, {methods: row_number}]} mapping
-        self.class_row_mapping = defaultdict(list)
-        # mapping to store dark edges -> 0: [17, 10, 13] is a COLUMN:ROWS range.
-        self.dark_edges_column = defaultdict(list)
+        # {class: row number} and {(class, method): (row number, column number)} mappings
+        self.class_row = class_row = {}
+        self.method_row = method_row = {}
+        # mapping to store dark edges -> 0: [10, 17] is a COLUMN:[first row, last row] range.
+        self.dark_edges_column = defaultdict(lambda: [10**9, -1])
         self.inheritance_edges_column = defaultdict(list)
         prev_class_row_counter = 0
+        # bound once as locals, these are used for every class, method and edge.
+        extend_dark_edge = self._extend_dark_edge
+        method_column = skip_cols+2
         for class_data in agg_data:
             base_class = class_data['Class']
-            self.class_row_mapping[base_class] = [row_counter, {}]
+            class_row[base_class] = row_counter
             methods = class_data['Methods']
             parents = class_data['Parents']
             dependents = class_data['Dependents']
-            columns = ['' for _ in range(skip_cols+2)]
-            df.loc[row_counter] = columns + [base_class]
+            data[row_counter, -1] = base_class
             row_counter += 1
             for method in methods:
                 # print('Inserting method: {} of class: {} at row: {} and column: {}'.format(
                     # method, base_class, row_counter, skip_cols+1))
-                df.iloc[row_counter, skip_cols+2] = method
-                self.class_row_mapping[base_class][1][method] = (
-                    row_counter, skip_cols+2)
+                data[row_counter, method_column] = method
+                method_row[(base_class, method)] = (row_counter, method_column)
                 row_counter += 1
             if parents:
                 for parent in parents:
@@ -91,43 +175,40 @@ class WriteInExcel:
 
         for dependent in dependents_col_counter.keys():
             for column in dependents_col_counter[dependent]:
-                df.iloc[self.class_row_mapping[dependent][0], column] = "←"
-                self.dark_edges_column[column].append(
-                    self.class_row_mapping[dependent][0])
+                dependent_row = class_row[dependent]
+                data[dependent_row, column] = "←"
+                extend_dark_edge(column, dependent_row)
         # get a single list of dependees and parents so as to draw a common vertical pipe
-        dependees_and_parents_combined = set()
-        for dependee in dependee_to_dependents_mapping.keys():
-            dependees_and_parents_combined.add(dependee)
-        for parent in parent_to_child_mapping.keys():
-            dependees_and_parents_combined.add(parent)
+        dependees_and_parents_combined = dependee_to_dependents_mapping.keys(
+        ) | parent_to_child_mapping.keys()
         print("All classes that are parents or dependees are: ")
         print(dependees_and_parents_combined)
         for class_ in dependees_and_parents_combined:
-            if not self.class_row_mapping.get(class_, None):
+            row = class_row.get(class_)
+            if row is None:
                 print(
                     'This class is in dependees and parents combined but not in class row mapping: {}'.format(class_))
                 continue
-            df.iloc[self.class_row_mapping[class_][0]][column_counter] = "⇒"
-            self.dark_edges_column[column_counter].append(
-                self.class_row_mapping[class_][0]
-            )
-            if class_ in dependee_to_dependents_mapping:
-                df.iloc[self.class_row_mapping[class_][0]][skip_cols] = "⇒"
-                for dependent in dependee_to_dependents_mapping[class_]:
-                    df.iloc[self.class_row_mapping[dependent]
-                            [0], column_counter] = "←"
-                    self.dark_edges_column[column_counter].append(
-                        self.class_row_mapping[dependent][0])
-            if class_ in parent_to_child_mapping:
-                df.iloc[self.class_row_mapping[class_][0]][skip_cols+1] = "▷"
-                for child in parent_to_child_mapping[class_]:
-                    df.iloc[self.class_row_mapping[child]
-                            [0], column_counter] = "◁"
-                    self.dark_edges_column[column_counter].append(
-                        self.class_row_mapping[child][0])
+            data[row, column_counter] = "⇒"
+            extend_dark_edge(column_counter, row)
+            # .get doesn't insert into the defaultdicts, so a single lookup
+            # serves as both the membership test and the fetch.
+            dependents = dependee_to_dependents_mapping.get(class_)
+            if dependents:
+                data[row, skip_cols] = "⇒"
+                for dependent in dependents:
+                    dependent_row = class_row[dependent]
+                    data[dependent_row, column_counter] = "←"
+                    extend_dark_edge(column_counter, dependent_row)
+            children = parent_to_child_mapping.get(class_)
+            if children:
+                data[row, skip_cols+1] = "▷"
+                for child in children:
+                    child_row = class_row[child]
+                    data[child_row, column_counter] = "◁"
+                    extend_dark_edge(column_counter, child_row)
             column_counter -= 1
-        # convert all NaN to None.
-        df = df.replace(np.nan, '', regex=True)
+        df = pd.DataFrame(data, columns=columns+['Class'])
         # print("Create DF was called.")
         # print(df)
         return df
@@ -143,38 +224,35 @@ class WriteInExcel:
         Returns:
             [type] -- 
         """
-        # add new columns in dataframe
+        # add new columns in dataframe, prefilled with '' so that no NaN needs replacing later.
         number_of_columns_pre_sequence = len(df.columns)
-        for event_number in range(len(function_sequence)):
-            df['{}'.format(event_number)] = np.nan
-        event_counter = 1
-        # counter to check whether its the first or last column in sequence diagram section
-        for event in function_sequence:
-            print("Event is: {}".format(event))
-            if "main_2" in event:
-                continue
-            caller, callee = event
-            print("caller is: {}".format(caller))
-            caller_class, caller_function = caller.split('.')
-            callee_class, callee_function = callee.split('.')
-            caller_row_number, caller_column_number = self.class_row_mapping[
-                caller_class][1][caller_function]
-            callee_row_number, callee_column_number = self.class_row_mapping[
-                callee_class][1][callee_function]
-            caller_column_number, callee_column_number = number_of_columns_pre_sequence + \
-                event_counter - 1, number_of_columns_pre_sequence + event_counter - 1
-            self.dark_edges_column[caller_column_number].extend(
-                [caller_row_number, callee_row_number])
-            if df.iloc[caller_row_number, caller_column_number] == "←":
-                df.iloc[caller_row_number, caller_column_number] = "↔"
+        event_columns = pd.DataFrame(
+            '', index=df.index,
+            columns=['{}'.format(event_number)
+                     for event_number in range(len(function_sequence))]
+        )
+        df = pd.concat([df, event_columns], axis=1)
+        method_row = self.method_row
+        extend_dark_edge = self._extend_dark_edge
+        iat = df.iat
+        # each event gets its own column in the sequence diagram section
+        events = enumerate(_normalize_sequence(
+            function_sequence), number_of_columns_pre_sequence)
+        for event_column, (caller, callee) in events:
+            log.debug("Event is: %s -> %s", caller, callee)
+            caller_row_number, _ = method_row[caller]
+            callee_row_number, _ = method_row[callee]
+            caller_column_number = callee_column_number = event_column
+            extend_dark_edge(caller_column_number, caller_row_number)
+            extend_dark_edge(caller_column_number, callee_row_number)
+            if iat[caller_row_number, caller_column_number] == "←":
+                iat[caller_row_number, caller_column_number] = "↔"
             else:
-                df.iloc[caller_row_number, caller_column_number] = "→"
-            if df.iloc[callee_row_number, callee_column_number] == "→":
-                df.iloc[callee_row_number, callee_column_number] = "↔"
+                iat[caller_row_number, caller_column_number] = "→"
+            if iat[callee_row_number, callee_column_number] == "→":
+                iat[callee_row_number, callee_column_number] = "↔"
             else:
-                df.iloc[callee_row_number, callee_column_number] = "←"
-            event_counter += 1
-        df = df.replace(np.nan, '', regex=True)
+                iat[callee_row_number, callee_column_number] = "←"
         return df
 
     def write_df_to_excel(self, df, sheet_name, skip_cols, classes={}, use_case=None):
@@ -192,86 +270,102 @@ class WriteInExcel:
         # print("Use Case as an argument is: {}".format(use_case))
         self.count += 1
         if self.count == 2:
+            # the use case gets a file of its own, so save what was written so far first.
+            self.finalize()
             self.file_name = 'Use_Case_{}'.format(use_case) + self.file_name
-            self.writer = pd.ExcelWriter(self.file_name, engine='xlsxwriter')
-        df.to_excel(self.writer, sheet_name=sheet_name,
-                    header=True, index=False)
-        self.writer.save()
-        self.writer.close()
-        import sys
-        wb = load_workbook(filename=self.file_name)
-        ws = wb[sheet_name]
-        ws.column_dimensions['{}'.format(get_column_letter(
-            skip_cols+1))].width = 8.4  # len(Parent) = (6+1)*1.2
-        # len(Methods/Children) + 1(M) + 1(C) + 1(/) = 19*1.2
-        ws.column_dimensions['{}'.format(
-            get_column_letter(skip_cols+2))].width = 22.8
-        bd = Side(style='thick', color='000000')
+        if self.workbook is None:
+            # write-only workbooks stream their cells to disk on save instead of
+            # keeping a Cell object per cell, so every style is decided before a row is appended.
+            self.workbook = Workbook(write_only=True)
+            self.sheets = {}
+        wb = self.workbook
+        if sheet_name in self.sheets:
+            wb.remove(self.sheets.pop(sheet_name))
+        ws = wb.create_sheet(sheet_name)
+        self.sheets[sheet_name] = ws
+        number_of_columns = len(df.columns)
+        if use_case:
+            # the use case is written in a row of its own above the header.
+            number_of_columns = max(number_of_columns, skip_cols+4)
+        # col_letters[i] is the letter of the 0-indexed column i.
+        col_letters = [get_column_letter(col_counter)
+                       for col_counter in range(1, number_of_columns+1)]
+        column_dimensions = ws.column_dimensions
+        row_dimensions = ws.row_dimensions
+        dark_edges_column = self.dark_edges_column
+        # adjust the width of all columns, this has to happen before the first row is appended.
+        for col_counter in range(1, number_of_columns+1):
+            if col_counter == skip_cols+3:
+                column_dimensions[col_letters[col_counter-1]].width = 36
+                continue
+            else:
+                column_dimensions[col_letters[col_counter-1]].hidden = True
+            column_dimensions[col_letters[col_counter-1]].width = 3
         # to check whether a col in sheet's columns has arrived for dark edges.
-        col_check_counter = 0
         print('Skip columns are: {}'.format(skip_cols))
-        for _ in ws.columns:
-            if col_check_counter in self.dark_edges_column:
-                print('Col {} is in dark edges column'.format(col_check_counter))
-                column_letter = get_column_letter(col_check_counter+1)
-                row_range = sorted(self.dark_edges_column[col_check_counter])
-                '''
-                plus one because dataframe's 0 is excel'1 but column headings are on 1 so we need to start from 2.
-                the second addition of changing 0-indexed to 1-indexed comes in the next line while plotting.
-                Now, second index of list is +2 so that we can cover the full range(0 to 3 is to be covered,
-                so for loop would be from range(0,4))
-                get the first and last row to draw the dark edges.
-                '''
-                for row_iterator in range(row_range[0]+1, row_range[-1]+2):
-                    print('{}{}'.format(column_letter, row_iterator+1))
-                    if col_check_counter >= skip_cols:  # should it be > or >=
-                        ws['{}{}'.format(column_letter, row_iterator+1)
-                           ].border = Border(right=bd)
-                    else:
-                        ws['{}{}'.format(column_letter, row_iterator+1)
-                           ].border = Border(left=bd)
-            col_check_counter += 1
-
-        red_fill = PatternFill(
-            start_color='FFFF0000',
-            end_color='FFFF0000',
-            fill_type='solid'
-        )
-        for row in range(1, ws.max_row+1):
-            column_letter = get_column_letter(skip_cols+1)
-            if ws['{}{}'.format(column_letter, row)].value:
-                ws['{}{}'.format(column_letter, row)].fill = red_fill
-            column_letter = get_column_letter(skip_cols+2)
-            if ws['{}{}'.format(column_letter, row)].value:
-                ws['{}{}'.format(column_letter, row)].fill = red_fill
+        # (column, first row, last row, border) of every dark edge to be drawn.
+        dark_edges = []
+        for col_check_counter in range(number_of_columns):
+            if col_check_counter in dark_edges_column:
+                log.debug('Col %s is in dark edges column', col_check_counter)
+                # get the first and last row of the dataframe to draw the dark edges.
+                first_row, last_row = dark_edges_column[col_check_counter]
+                if col_check_counter >= skip_cols:  # should it be > or >=
+                    border = BORDER_RIGHT
+                else:
+                    border = BORDER_LEFT
+                dark_edges.append(
+                    (col_check_counter, first_row, last_row, border))
+
         # add a new row in the worksheet
+        row_offset = 1
         if use_case:
             print("Working for the Use Case: {}".format(use_case))
-            ws.insert_rows(0)
-            use_case_column_letter = get_column_letter(skip_cols+4)
-            use_case_cell = '{}{}'.format(use_case_column_letter, 1)
-            print("Use Case cell is {}".format(use_case_cell))
-            ws[use_case_cell] = use_case
-            # adjust the width of all columns
-        col_counter = 1
-        for _ in ws.columns:
-            if col_counter == skip_cols+3:
-                ws.column_dimensions[get_column_letter(col_counter)].width = 36
-                col_counter += 1
-                continue
-            else:
-                ws.column_dimensions[get_column_letter(
-                    col_counter)].hidden = True
-            ws.column_dimensions[get_column_letter(col_counter)].width = 3
-            col_counter += 1
-        # give bold font to cells with Classes
-        classes_column = get_column_letter(skip_cols+3)
-        font = Font(bold=True)
-        for row in range(1, ws.max_row+1):
-            if ws['{}{}'.format(classes_column, row)].value:
-                if ws['{}{}'.format(classes_column, row)].value in classes:
-                    ws['{}{}'.format(classes_column, row)].font = font
+            use_case_row = [None for _ in range(skip_cols+4)]
+            use_case_row[skip_cols+3] = use_case
+            print("Use Case cell is {}{}".format(
+                col_letters[skip_cols+3], 1))
+            ws.append(use_case_row)
+            row_offset += 1
+        # header row, styled like pandas' to_excel.
+        header = []
+        for column in df.columns:
+            cell = WriteOnlyCell(ws, value=column)
+            cell.border = HEADER_BORDER
+            cell.font = BOLD_FONT
+            cell.alignment = HEADER_ALIGNMENT
+            header.append(cell)
+        rows = chain([(-1, header)], enumerate(
+            list(row) for row in df.itertuples(index=False, name=None)))
+        for row_number, row in rows:
+            # dataframe's 0 is excel's 1 but column headings are on 1 (or 2 after a use case).
+            excel_row = row_number + row_offset + 1
+            for column, first_row, last_row, border in dark_edges:
+                if first_row <= row_number <= last_row:
+                    log.debug('%s%s', col_letters[column], excel_row)
+                    cell = _as_cell(ws, row, column)
+                    cell.border = border
+            # fill the parent and methods/children cells red,
+            # give bold font to cells with Classes and hide rows of other names.
+            for column in (skip_cols, skip_cols+1):
+                if _cell_value(row[column]):
+                    _as_cell(ws, row, column).fill = RED_FILL
+            value = _cell_value(row[skip_cols+2])
+            if value:
+                if value in classes:
+                    _as_cell(ws, row, skip_cols+2).font = BOLD_FONT
                 else:
-                    ws.row_dimensions[row].hidden = True
-        wb.save(self.file_name)
+                    row_dimensions[excel_row].hidden = True
+            ws.append(row)
         print("{}:{} done!".format(self.file_name, sheet_name))
+
+    def finalize(self):
+        """save the sheets written so far to the excel file. Call it once after
+        the last write_df_to_excel of a file; the next write starts a new workbook.
+        """
+        if self.workbook is None:
+            return
+        self.workbook.save(self.file_name)
+        # a write-only workbook can only be saved once.
+        self.workbook = None
+        self.sheets = {}